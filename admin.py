@@ -1,11 +1,12 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 from database import SessionLocal, Users, Documents, Logs # Import specific models
 from auth import create_user # UPDATED IMPORT
 import os
 import shutil
 
+# pandas / plotly are imported inside the tabs that use them, so regular
+# users and the login page never pay for them.
+
 # --- Database Session ---
 def get_db():
     """Utility to get a new database session."""
@@ -19,6 +20,8 @@ def get_db():
 
 # --- Tab 1: User Management ---
 def user_management():
+    import pandas as pd
+
     st.subheader("User Management")
     
     db = get_db()
@@ -103,6 +106,8 @@ def user_management():
 
 # --- Tab 2: Document Management ---
 def document_management():
+    import pandas as pd
+
     st.subheader("All Uploaded Documents")
     
     db = get_db()
@@ -165,6 +170,8 @@ def document_management():
 
 # --- Tab 3: Audit Logs ---
 def audit_logs():
+    import pandas as pd
+
     st.subheader("System Audit Logs")
     
     db = get_db()
@@ -198,6 +205,9 @@ def audit_logs():
 
 # --- Tab 4: System Stats ---
 def system_stats():
+    import pandas as pd
+    import plotly.express as px
+
     st.subheader("System Statistics")
     
     db = get_db()
@@ -1,11 +1,11 @@
 import streamlit as st
 import auth 
 from database import SessionLocal, Logs, Documents, Users 
-import admin 
+import admin  # light: pandas/plotly load inside the admin tabs
 import datetime
 import json
 import os
-import rag_pipeline 
+import rag_pipeline  # light: langchain/torch/FAISS/OCR load on first use
 import time
 
 # 1. PAGE CONFIG
@@ -58,6 +58,10 @@ def show_login_page():
                         'role': user.role
                     })
                     log_action(user.id, "LOGIN", "User logged in")
+                    # Load the RAG stack in the background (the admin
+                    # dashboard imports its charting libraries as it renders)
+                    if user.role != "admin":
+                        rag_pipeline.prewarm()
                     st.rerun()
                 else:
                     st.error("Invalid credentials")
@@ -118,12 +122,16 @@ def show_user_app():
                         with open(path, "wb") as b: b.write(f.getbuffer())
                         
                         docs = rag_pipeline.load_documents_with_ocr(path)
-                        all_chunks.extend(rag_pipeline.get_text_chunks(docs))
+                        chunks = rag_pipeline.get_text_chunks(docs)
+                        all_chunks.extend(chunks)
                         
                         db = SessionLocal()
-                        if not db.query(Documents).filter_by(filename=f.name, user_id=user_id).first():
-                            db.add(Documents(filename=f.name, file_path=path, user_id=user_id))
-                            db.commit()
+                        doc_row = db.query(Documents).filter_by(filename=f.name, user_id=user_id).first()
+                        if not doc_row:
+                            doc_row = Documents(filename=f.name, file_path=path, user_id=user_id)
+                            db.add(doc_row)
+                        doc_row.chunk_count = len(chunks)
+                        db.commit()
                         db.close()
 
                     if all_chunks:
@@ -1,48 +1,455 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+"""
+FAISS index inspection & maintenance tool.
+
+Reads each user's index straight from disk (index.faiss + index.pkl), so the
+embedding model is only loaded by `rebuild`, which has to re-embed text.
+
+Usage:
+    python inspect_faiss.py list
+    python inspect_faiss.py peek 1 -n 3
+    python inspect_faiss.py orphans
+    python inspect_faiss.py dupes --threshold 0.97
+    python inspect_faiss.py compact --all --dedupe --prune-orphans --workers 4
+    python inspect_faiss.py rebuild 1 2        (or --all)
+"""
+import argparse
+import datetime
 import os
+import pickle
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import faiss
+import numpy as np
+
+from database import SessionLocal, Documents, Users
+
+DATA_DIR = "data"
+INDEX_DIR = "faiss_index"
+BATCH_SIZE = 1024
+
+
+# ======================================================
+# 1. RAW INDEX ACCESS (no embedding model)
+# ======================================================
+def index_path(user_id):
+    return os.path.join(DATA_DIR, f"user_{user_id}", INDEX_DIR)
+
+
+def find_user_dirs():
+    """Returns {user_id: user_dir} for every data/user_<id> folder."""
+    found = {}
+    if not os.path.isdir(DATA_DIR):
+        return found
+    for name in os.listdir(DATA_DIR):
+        prefix, _, uid = name.partition("_")
+        if prefix == "user" and uid.isdigit():
+            found[int(uid)] = os.path.join(DATA_DIR, name)
+    return found
+
+
+def load_raw_index(user_id):
+    """Loads (index, docstore, index_to_docstore_id) as saved by FAISS.save_local."""
+    path = index_path(user_id)
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, id_map = pickle.load(f)
+    return index, docstore, id_map
+
+
+def temp_index_path(user_id):
+    """Fresh, empty staging folder next to the live index."""
+    tmp = index_path(user_id) + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    return tmp
+
+
+def swap_in(user_id, tmp):
+    """
+    Moves a fully written index from `tmp` into place. The live folder is
+    renamed aside before the new one is renamed in, and only deleted after,
+    so a reader can only miss the index between the two renames. After a
+    crash the previous index is still in `faiss_index.old`.
+    """
+    path = index_path(user_id)
+    old = path + ".old"
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def save_raw_index(user_id, index, docstore, id_map):
+    tmp = temp_index_path(user_id)
+    faiss.write_index(index, os.path.join(tmp, "index.faiss"))
+    with open(os.path.join(tmp, "index.pkl"), "wb") as f:
+        pickle.dump((docstore, id_map), f)
+    swap_in(user_id, tmp)
+
+
+def index_bytes(user_id):
+    path = index_path(user_id)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in ("index.faiss", "index.pkl")
+               if os.path.exists(os.path.join(path, f)))
+
+
+def has_index(user_id):
+    return os.path.exists(os.path.join(index_path(user_id), "index.faiss"))
+
+
+def all_vectors(index):
+    return index.reconstruct_n(0, index.ntotal).astype("float32")
+
+
+# ======================================================
+# 2. ANALYSIS
+# ======================================================
+def load_db_state():
+    """Returns ({user_id: username}, {user_id: [Documents rows]}) in one session."""
+    db = SessionLocal()
+    try:
+        users = {u.id: u.username for u in db.query(Users).all()}
+        docs = {}
+        for d in db.query(Documents).all():
+            docs.setdefault(d.user_id, []).append(d)
+        return users, docs
+    finally:
+        db.close()
+
+
+def find_orphan_vectors(docstore, id_map, known_sources):
+    """Positions whose docstore entry is missing or whose source is no longer in Documents."""
+    orphans = []
+    for pos, doc_id in id_map.items():
+        doc = docstore._dict.get(doc_id)
+        if doc is None or os.path.normpath(doc.metadata.get("source", "")) not in known_sources:
+            orphans.append(pos)
+    return orphans
+
+
+def find_duplicates(vectors, threshold, max_pairs=0):
+    """
+    Batched cosine self-similarity. Returns (n_pairs, pairs, drop): the number
+    of pairs (i < j) above the threshold, the first `max_pairs` of them as
+    (i, j, score), and the set of positions that are near-copies of an
+    earlier kept vector. Uses a range search so every pair above the
+    threshold is found, however many copies a chunk has, while only the
+    per-batch NumPy arrays hold the full result.
+    """
+    n = len(vectors)
+    if n < 2:
+        return 0, [], set()
+    normed = vectors.copy()
+    faiss.normalize_L2(normed)
+    sim_index = faiss.IndexFlatIP(normed.shape[1])
+    sim_index.add(normed)
+
+    n_pairs, pairs, drop = 0, [], set()
+    for start in range(0, n, BATCH_SIZE):
+        lims, scores, neighbours = sim_index.range_search(normed[start:start + BATCH_SIZE], threshold)
+        rows = np.repeat(np.arange(start, start + len(lims) - 1), np.diff(lims))
+        later = neighbours > rows
+        n_pairs += int(later.sum())
+
+        if len(pairs) < max_pairs:
+            take = np.flatnonzero(later)[:max_pairs - len(pairs)]
+            pairs.extend(zip(rows[take].tolist(), neighbours[take].tolist(), scores[take].tolist()))
+
+        # Greedy keep-first: rows must be visited in order, but each row's
+        # copies are added in one step
+        for row in range(len(lims) - 1):
+            i = start + row
+            if i in drop:
+                continue
+            copies = neighbours[lims[row]:lims[row + 1]]
+            drop.update(copies[copies > i].tolist())
+    return n_pairs, pairs, drop
+
+
+def user_report(user_id, known_sources, doc_rows):
+    """Size, staleness and orphan summary for one user's index."""
+    report = {"user_id": user_id, "vectors": 0, "bytes": 0, "dim": None,
+              "db_docs": len(doc_rows), "db_chunks": sum(d.chunk_count or 0 for d in doc_rows),
+              "missing_docs": [], "orphan_vectors": 0, "stale": False}
+    if not has_index(user_id):
+        report["stale"] = bool(doc_rows)
+        return report
+
+    index, docstore, id_map = load_raw_index(user_id)
+    report.update(vectors=index.ntotal, bytes=index_bytes(user_id), dim=index.d)
+
+    indexed_sources = {os.path.normpath(d.metadata.get("source", "")) for d in docstore._dict.values()}
+    report["missing_docs"] = [d.filename for d in doc_rows
+                              if os.path.normpath(d.file_path or "") not in indexed_sources]
+    report["orphan_vectors"] = len(find_orphan_vectors(docstore, id_map, known_sources))
+
+    # Naive UTC, to compare with upload_date (datetime.utcnow)
+    mtime = os.path.getmtime(os.path.join(index_path(user_id), "index.faiss"))
+    built = datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc).replace(tzinfo=None)
+    newest_upload = max((d.upload_date for d in doc_rows if d.upload_date), default=None)
+    report["stale"] = bool(report["missing_docs"] or report["orphan_vectors"]
+                           or (newest_upload and newest_upload > built))
+    return report
+
+
+def orphan_files(user_dir, known_sources):
+    """Files in the user's folder (outside the index) that no Documents row points to."""
+    orphans = []
+    for name in os.listdir(user_dir):
+        path = os.path.normpath(os.path.join(user_dir, name))
+        if name in (INDEX_DIR, INDEX_DIR + ".tmp", INDEX_DIR + ".old") or os.path.isdir(path):
+            continue
+        if path not in known_sources:
+            orphans.append(path)
+    return orphans
+
+
+# ======================================================
+# 3. MAINTENANCE (runs in worker processes)
+# ======================================================
+def compact_user(user_id, known_sources, dedupe, prune_orphans, threshold):
+    """Drops orphaned/duplicate vectors and writes a fresh flat index from the stored vectors."""
+    index, docstore, id_map = load_raw_index(user_id)
+    before = index.ntotal
+    drop = set()
+    if prune_orphans:
+        drop.update(find_orphan_vectors(docstore, id_map, known_sources))
+    vectors = all_vectors(index)
+    if dedupe:
+        drop.update(find_duplicates(vectors, threshold)[2])
+
+    keep = np.array([i for i in range(before) if i not in drop], dtype="int64")
+    new_index = faiss.IndexFlat(index.d, index.metric_type)
+    if len(keep):
+        new_index.add(vectors[keep])
+    new_id_map = {new_pos: id_map[int(old_pos)] for new_pos, old_pos in enumerate(keep)}
+    kept_ids = set(new_id_map.values())
+    docstore._dict = {k: v for k, v in docstore._dict.items() if k in kept_ids}
+
+    save_raw_index(user_id, new_index, docstore, new_id_map)
+    return user_id, before, new_index.ntotal
+
+
+def rebuild_user(user_id, doc_files):
+    """
+    Re-ingests the user's registered documents from scratch (loads the
+    embedding model). `doc_files` is [(document_id, file_path)]; returns
+    (user_id, vectors, {document_id: chunk_count}) so the parent process
+    can update Documents.
+    """
+    import rag_pipeline
+    from langchain_community.vectorstores import FAISS
+
+    chunks, chunk_counts = [], {}
+    for doc_id, path in doc_files:
+        doc_chunks = []
+        if path and os.path.exists(path):
+            doc_chunks = rag_pipeline.get_text_chunks(rag_pipeline.load_documents_with_ocr(path))
+        chunk_counts[doc_id] = len(doc_chunks)
+        chunks.extend(doc_chunks)
+    if not chunks:
+        return user_id, 0, {}
+    # Built into a staging folder and swapped in, like compact
+    vs = FAISS.from_documents(chunks, rag_pipeline.get_embeddings())
+    tmp = temp_index_path(user_id)
+    vs.save_local(tmp)
+    swap_in(user_id, tmp)
+    return user_id, vs.index.ntotal, chunk_counts
+
+
+def save_chunk_counts(chunk_counts):
+    """Writes {document_id: chunk_count} back to the Documents table."""
+    db = SessionLocal()
+    try:
+        for doc in db.query(Documents).filter(Documents.id.in_(list(chunk_counts))).all():
+            doc.chunk_count = chunk_counts[doc.id]
+        db.commit()
+    except Exception as e:
+        print(f"❌ Could not update chunk counts: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+# ======================================================
+# 4. COMMANDS
+# ======================================================
+def fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def sources_for(doc_rows):
+    return {os.path.normpath(d.file_path) for d in doc_rows if d.file_path}
+
+
+def target_users(args, users, user_dirs):
+    if getattr(args, "all", False) or not args.user_ids:
+        return sorted(uid for uid in user_dirs if has_index(uid) and uid in users)
+    return args.user_ids
+
+
+def cmd_list(args):
+    users, docs = load_db_state()
+    user_dirs = find_user_dirs()
+    print(f"{'USER':>5}  {'NAME':<16} {'VECTORS':>8} {'DIM':>5} {'SIZE':>10} {'DOCS':>5} {'CHUNKS':>7}  STATUS")
+    total_vectors = total_bytes = 0
+    for uid in sorted(set(user_dirs) | set(docs)):
+        r = user_report(uid, sources_for(docs.get(uid, [])), docs.get(uid, []))
+        total_vectors += r["vectors"]
+        total_bytes += r["bytes"]
+        status = []
+        if uid not in users:
+            status.append("NO USER")
+        if not has_index(uid):
+            status.append("NO INDEX")
+        if r["stale"]:
+            status.append("STALE")
+        if r["orphan_vectors"]:
+            status.append(f"{r['orphan_vectors']} orphan vectors")
+        if r["missing_docs"]:
+            status.append(f"{len(r['missing_docs'])} docs not indexed")
+        print(f"{uid:>5}  {users.get(uid, '?'):<16} {r['vectors']:>8} {r['dim'] or '-':>5} "
+              f"{fmt_bytes(r['bytes']):>10} {r['db_docs']:>5} {r['db_chunks']:>7}  {', '.join(status) or 'OK'}")
+    print(f"\n📊 Total: {total_vectors} vectors, {fmt_bytes(total_bytes)}")
+
+
+def cmd_peek(args):
+    if not has_index(args.user_id):
+        print(f"❌ Error: No database found at {index_path(args.user_id)}")
+        return
+    index, docstore, id_map = load_raw_index(args.user_id)
+    print(f"--- 📂 Inspecting Database at: {index_path(args.user_id)} ---")
+    print(f"📊 Total Text Chunks Stored: {index.ntotal}")
+    for pos in range(min(args.n, index.ntotal)):
+        doc = docstore._dict.get(id_map[pos])
+        if doc is None:
+            print(f"\n[{pos}] ⚠️ missing from docstore")
+            continue
+        preview = doc.page_content[:200].replace("\n", " ")
+        print(f"\n[{pos}] Source: {doc.metadata.get('source', 'Unknown')} | Page: {doc.metadata.get('page', 'Unknown')}"
+              f" | Section: {doc.metadata.get('section_title') or '-'}")
+        print(f"Content Preview: {preview}...")
+
+
+def cmd_orphans(args):
+    users, docs = load_db_state()
+    found = False
+    for uid, user_dir in sorted(find_user_dirs().items()):
+        known = sources_for(docs.get(uid, []))
+        if uid not in users:
+            found = True
+            print(f"🗑️  {user_dir}: folder has no matching user")
+        for path in orphan_files(user_dir, known):
+            found = True
+            print(f"🗑️  {path}: file not in Documents")
+        if has_index(uid):
+            index, docstore, id_map = load_raw_index(uid)
+            n = len(find_orphan_vectors(docstore, id_map, known))
+            if n:
+                found = True
+                print(f"🗑️  user {uid}: {n}/{index.ntotal} vectors point at unknown documents")
+    if not found:
+        print("✅ No orphans found.")
+
+
+def cmd_dupes(args):
+    users, _ = load_db_state()
+    for uid in target_users(args, users, find_user_dirs()):
+        if not has_index(uid):
+            continue
+        index, docstore, id_map = load_raw_index(uid)
+        n_pairs, pairs, drop = find_duplicates(all_vectors(index), args.threshold, args.show)
+        print(f"\n👤 user {uid}: {n_pairs} near-duplicate pairs, {len(drop)}/{index.ntotal} removable")
+        for i, j, score in pairs:
+            a = docstore._dict.get(id_map[i])
+            b = docstore._dict.get(id_map[j])
+            a_text = a.page_content[:80].replace("\n", " ") if a else "?"
+            b_text = b.page_content[:80].replace("\n", " ") if b else "?"
+            print(f"  {score:.3f}  [{i}] {a_text}\n         [{j}] {b_text}")
+
+
+def cmd_compact(args):
+    users, docs = load_db_state()
+    targets = [uid for uid in target_users(args, users, find_user_dirs()) if has_index(uid)]
+    if not targets:
+        print("Nothing to compact.")
+        return
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(compact_user, uid, sources_for(docs.get(uid, [])),
+                               args.dedupe, args.prune_orphans, args.threshold) for uid in targets]
+        for fut in futures:
+            try:
+                uid, before, after = fut.result()
+                print(f"✅ user {uid}: {before} -> {after} vectors")
+            except Exception as e:
+                print(f"❌ Compaction failed: {e}")
+
+
+def cmd_rebuild(args):
+    users, docs = load_db_state()
+    targets = sorted(uid for uid in docs if uid in users) if args.all else args.user_ids
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(rebuild_user, uid, [(d.id, d.file_path) for d in docs.get(uid, [])])
+                   for uid in targets]
+        for fut in futures:
+            try:
+                uid, n, chunk_counts = fut.result()
+                if chunk_counts:
+                    save_chunk_counts(chunk_counts)
+                print(f"✅ user {uid}: rebuilt with {n} vectors" if n else f"⚠️ user {uid}: no text found")
+            except Exception as e:
+                print(f"❌ Rebuild failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain per-user FAISS indexes.")
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("list", help="Index sizes, vector counts and staleness for all users")
+
+    p = sub.add_parser("peek", help="Show the first chunks of one user's index")
+    p.add_argument("user_id", type=int)
+    p.add_argument("-n", type=int, default=3)
+
+    sub.add_parser("orphans", help="Find orphaned vectors, files and user folders")
+
+    p = sub.add_parser("dupes", help="Find near-duplicate chunks")
+    p.add_argument("user_ids", type=int, nargs="*")
+    p.add_argument("--threshold", type=float, default=0.97)
+    p.add_argument("--show", type=int, default=5)
+
+    p = sub.add_parser("compact", help="Rewrite indexes offline without re-embedding")
+    p.add_argument("user_ids", type=int, nargs="*")
+    p.add_argument("--all", action="store_true")
+    p.add_argument("--dedupe", action="store_true")
+    p.add_argument("--prune-orphans", action="store_true")
+    p.add_argument("--threshold", type=float, default=0.97)
+    p.add_argument("--workers", type=int, default=os.cpu_count())
+
+    p = sub.add_parser("rebuild", help="Re-ingest documents and re-embed (loads the model)")
+    p.add_argument("user_ids", type=int, nargs="*")
+    p.add_argument("--all", action="store_true")
+    p.add_argument("--workers", type=int, default=2)
+
+    args = parser.parse_args()
+    # Commands that rewrite indexes never default to every user
+    if args.command in ("compact", "rebuild"):
+        if not args.user_ids and not args.all:
+            parser.error(f"{args.command} needs user ids or --all")
+        if args.user_ids and args.all:
+            parser.error("give either user ids or --all, not both")
+    commands = {"list": cmd_list, "peek": cmd_peek, "orphans": cmd_orphans,
+                "dupes": cmd_dupes, "compact": cmd_compact, "rebuild": cmd_rebuild}
+    commands.get(args.command or "list", cmd_list)(args)
+
 
-# 1. SETUP: Point to the specific user's folder you want to inspect
-USER_ID = 1 
-folder_path = f"data/user_{USER_ID}/faiss_index"
-
-# 2. CHECK: Does the folder exist?
-if not os.path.exists(folder_path):
-    print(f"❌ Error: No database found at {folder_path}")
-    print("   (Did you process a document for this user yet?)")
-    exit()
-
-print(f"--- 📂 Inspecting Database at: {folder_path} ---")
-
-# 3. LOAD: Open the database using the same embedding model
-try:
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vs = FAISS.load_local(folder_path, embeddings, allow_dangerous_deserialization=True)
-    
-    # 4. STATS: How much data is here?
-    print(f"✅ Database Loaded Successfully!")
-    print(f"📊 Total Text Chunks Stored: {vs.index.ntotal}")
-    
-    # 5. PEEK: Show me the first few stored items
-    print("\n--- 📝 SAMPLE CONTENT (First 3 Chunks) ---")
-    
-    # Access the internal dictionary of documents
-    docstore = vs.docstore._dict
-    
-    count = 0
-    for key, doc in docstore.items():
-        print(f"\n[Chunk ID: {key}]")
-        print(f"Source: {doc.metadata.get('source', 'Unknown')}")
-        print(f"Page: {doc.metadata.get('page', 'Unknown')}")
-        
-        # FIX: Clean the text into a variable first to avoid the backslash error
-        raw_text = doc.page_content[:200]
-        clean_text = raw_text.replace('\n', ' ')
-        
-        print(f"Content Preview: {clean_text}...")
-        
-        count += 1
-        if count >= 3: break 
-
-except Exception as e:
-    print(f"❌ Error reading database: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,80 @@
+import importlib
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM 
-from langchain_core.documents import Document
-from pdf2image import convert_from_path
-import pytesseract
+import re
+import threading
+import time
+
+# Heavy subsystems (langchain, sentence-transformers/torch, FAISS, OCR, Ollama)
+# are imported on first use, so importing this module is cheap for the login page.
+LOAD_TIMES = {}      # label -> seconds spent on first load (shown by startup_report.py)
+PREWARM_ERRORS = {}  # label -> error message for pre-warm steps that failed
+
+# The langchain_community packages resolve their members lazily, so pre-warm
+# imports the concrete modules that pull in pypdf, FAISS and the loaders.
+PREWARM_MODULES = {
+    "ingestion": ["pypdf", "langchain_community.document_loaders.pdf"],
+    "vectorstore": ["faiss", "langchain_community.vectorstores.faiss"],
+    "llm": ["langchain_ollama"],
+}
+_embeddings = None
+_embeddings_lock = threading.Lock()
+_prewarm_lock = threading.Lock()
+_prewarm_started = False
+
+
+def _timed(label, loader):
+    start = time.perf_counter()
+    result = loader()
+    LOAD_TIMES.setdefault(label, time.perf_counter() - start)
+    return result
+
+
+def get_embeddings():
+    """Loads the embedding model once per process and reuses it."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            def load():
+                from langchain_huggingface import HuggingFaceEmbeddings
+                return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={"device": "cpu"})
+            _embeddings = _timed("embeddings", load)
+    return _embeddings
+
+
+def _prewarm():
+    for label, modules in PREWARM_MODULES.items():
+        try:
+            _timed(label, lambda: [importlib.import_module(m) for m in modules])
+        except Exception as e:
+            PREWARM_ERRORS[label] = str(e)
+            print(f"⚠️ Pre-warm of {label} failed: {e}")
+    try:
+        # Builds HuggingFaceEmbeddings, which imports sentence_transformers/torch
+        get_embeddings()
+    except Exception as e:
+        PREWARM_ERRORS["embeddings"] = str(e)
+        print(f"⚠️ Pre-warm of embeddings failed: {e}")
+
+
+def prewarm(background=True):
+    """Loads the RAG stack, in a background thread by default (once per process)."""
+    global _prewarm_started
+    with _prewarm_lock:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+    if background:
+        threading.Thread(target=_prewarm, name="rag-prewarm", daemon=True).start()
+    else:
+        _prewarm()
 
 # ======================================================
 # 1. ROBUST LOADING (OCR Support)
 # ======================================================
 def load_documents_with_ocr(file_path: str):
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_core.documents import Document
+
     print(f"\n--- 📂 Loading: {os.path.basename(file_path)} ---")
     try:
         # 1. Try standard digital load
@@ -25,6 +87,9 @@ def load_documents_with_ocr(file_path: str):
     # 2. Fallback to OCR
     print("⚠️ Digital load failed. Switching to OCR...")
     try:
+        from pdf2image import convert_from_path
+        import pytesseract
+
         images = convert_from_path(file_path)
         ocr_docs = []
         for i, img in enumerate(images):
@@ -37,18 +102,322 @@ def load_documents_with_ocr(file_path: str):
         return []
 
 # ======================================================
-# 2. CHUNKING (Optimized for Tables/Sections)
+# 2. CHUNKING (Structure-aware: headings, tables, pages)
 # ======================================================
+CHUNK_SIZE = 800          # target size of a text chunk (chars)
+TABLE_CHUNK_SIZE = 1500   # tables are kept whole up to this size
+MAX_PARENT_CHARS = 6000   # largest section pulled back in at answer time
+SECTION_HIT_THRESHOLD = 2 # hits in one section before the whole section is used
+
+_MD_HEADING = re.compile(r"^#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVXLC]+\.|[A-Z]\.)\s+[A-Za-z]")
+_DOTTED_NUMBER = re.compile(r"^\d+(\.\d+)+\.?\s")
+_LIST_ITEM = re.compile(r"^(\d+|[A-Za-z]|[IVXLCivxlc]+)[.)]\s")
+_MINOR_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "vs", "with"}
+_CELL_SPLIT = re.compile(r"\s{2,}|\t|\s*\|\s*")
+_NUMERIC = re.compile(r"^[-+(]?[$€£₹]?\d[\d,.]*%?\)?$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _is_title_case(words):
+    return all(w[0].isupper() or w[0].isdigit() or w.lower() in _MINOR_WORDS for w in words)
+
+
+def _is_heading(line, in_list=False):
+    """`in_list` is True when the line before is a numbered item, i.e. this
+    line continues a list rather than introducing one."""
+    if len(line) > 80 or line.endswith((".", ",", ";")):
+        return False
+    if _MD_HEADING.match(line):
+        return True
+    words = line.split()
+    if _NUMBERED_HEADING.match(line) and len(words) <= 8:
+        # "1.2 Scope" is a heading; "1. Download the installer" is not, nor
+        # is a title-case item such as "2. Run Setup" partway through a list
+        if _DOTTED_NUMBER.match(line):
+            return words[1][0].isupper()
+        return not in_list and _is_title_case(words[1:])
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and line.isupper() and len(words) <= 10
+
+
+def _row_columns(line):
+    """Column count if the line looks like a table row, else 0.
+    Text cells must be short labels, not sentences, so justified prose with
+    double spaces does not qualify."""
+    cells = [c for c in _CELL_SPLIT.split(line) if c]
+    if len(cells) >= 3:
+        text_cells = [c for c in cells if not _NUMERIC.match(c)]
+        if all(len(c.split()) <= 5 and not c.endswith((".", ",")) for c in text_cells):
+            return len(cells)
+    tokens = line.split()
+    numeric = sum(1 for t in tokens if _NUMERIC.match(t))
+    if len(tokens) >= 3 and numeric >= 2 and numeric / len(tokens) >= 0.4:
+        return numeric + 1  # label column + numbers
+    return 0
+
+
+def _is_table(columns):
+    """At least two rows, and most rows share the same column count."""
+    if len(columns) < 2:
+        return False
+    common = max(set(columns), key=columns.count)
+    return columns.count(common) * 2 >= len(columns) and columns.count(common) >= 2
+
+
+def _iter_blocks(text):
+    """Yields (kind, text) blocks of one page: 'heading', 'table' or 'text'.
+    A table needs at least two consecutive table-like rows with consistent columns."""
+    lines = [line.strip() for line in text.splitlines()] + [""]
+    para, rows, columns = [], [], []
+    for i, s in enumerate(lines):
+        n_columns = _row_columns(s) if s else 0
+        if n_columns:
+            rows.append(s)
+            columns.append(n_columns)
+            continue
+        if _is_table(columns):
+            if para:
+                yield "text", " ".join(para)
+                para = []
+            yield "table", "\n".join(rows)
+        else:
+            para.extend(rows)
+        rows, columns = [], []
+
+        if not s:
+            if para:
+                yield "text", " ".join(para)
+                para = []
+        elif _is_heading(s, in_list=bool(i > 0 and _LIST_ITEM.match(lines[i - 1]))):
+            if para:
+                yield "text", " ".join(para)
+                para = []
+            yield "heading", s.lstrip("#").strip()
+        else:
+            para.append(s)
+
+
+def _split_long_text(text, size):
+    """Packs sentences into pieces of at most `size` chars (hard-splits runaway sentences)."""
+    piece = ""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > size:
+            if piece:
+                yield piece
+                piece = ""
+            yield sentence[:size]
+            sentence = sentence[size:]
+        if piece and len(piece) + 1 + len(sentence) > size:
+            yield piece
+            piece = ""
+        piece = f"{piece} {sentence}" if piece else sentence
+    if piece:
+        yield piece
+
+
+def _split_table(table, size):
+    """Splits a large table by rows, repeating the header row in every part."""
+    header, *rows = table.split("\n")
+    part = [header]
+    part_len = len(header)
+    for row in rows:
+        if len(part) > 1 and part_len + 1 + len(row) > size:
+            yield "\n".join(part)
+            part, part_len = [header], len(header)
+        part.append(row)
+        part_len += 1 + len(row)
+    yield "\n".join(part)
+
+
+def iter_structured_chunks(docs, chunk_size=CHUNK_SIZE, table_chunk_size=TABLE_CHUNK_SIZE):
+    """
+    Streams small, non-overlapping chunks out of page Documents in one pass.
+    Chunks never cross a section, table or page boundary and carry pointers
+    to their parent ('section_id', plus 'table_id' for table chunks) so the
+    full section/table can be reassembled at answer time.
+    """
+    from langchain_core.documents import Document
+
+    chunk_index = 0
+    source = None
+    section_id, section_title = None, ""
+    n_sections = n_tables = 0
+    buf, buf_len, buf_has_body = [], 0, False
+
+    def make(text, meta, **extra):
+        nonlocal chunk_index
+        doc = Document(page_content=text, metadata={
+            **meta,
+            "section_id": section_id,
+            "section_title": section_title,
+            "chunk_index": chunk_index,
+            **extra,
+        })
+        chunk_index += 1
+        return doc
+
+    meta = {}
+    for page in docs:
+        if page.metadata.get("source") != source:
+            if buf:
+                # Heading left over at the very end of the previous document
+                yield make("\n".join(buf), meta, block_type="text")
+                buf, buf_len, buf_has_body = [], 0, False
+            source = page.metadata.get("source")
+            n_sections = n_tables = 0
+            section_title = ""
+        meta = dict(page.metadata)
+        if not n_sections:
+            # Before the first heading, each page is its own section so a
+            # headingless document is never expanded as one giant parent
+            section_id = f"{source}::p{meta.get('page', 0)}"
+
+        for kind, text in _iter_blocks(page.page_content):
+            if kind == "heading":
+                if buf_has_body:
+                    yield make("\n".join(buf), meta, block_type="text")
+                    buf, buf_len, buf_has_body = [], 0, False
+                if not buf:
+                    n_sections += 1
+                    section_id = f"{source}::s{n_sections}"
+                section_title = text
+                buf.append(text)
+                buf_len += len(text) + 1
+                continue
+
+            if kind == "table":
+                # A bare heading right above a table is kept as its caption
+                caption = ""
+                if buf and not buf_has_body:
+                    caption = "\n".join(buf) + "\n"
+                elif buf:
+                    yield make("\n".join(buf), meta, block_type="text")
+                buf, buf_len, buf_has_body = [], 0, False
+                n_tables += 1
+                table_id = f"{source}::t{n_tables}"
+                parts = [text] if len(text) <= table_chunk_size else _split_table(text, table_chunk_size)
+                for part_no, part in enumerate(parts):
+                    if part_no == 0:
+                        part = caption + part
+                    yield make(part, meta, block_type="table", table_id=table_id, table_part=part_no)
+                continue
+
+            if buf_has_body and buf_len + len(text) > chunk_size:
+                yield make("\n".join(buf), meta, block_type="text")
+                buf, buf_len, buf_has_body = [], 0, False
+
+            if len(text) > chunk_size:
+                # A pending heading leads the first piece instead of being embedded alone
+                lead = "\n".join(buf)
+                buf, buf_len, buf_has_body = [], 0, False
+                for piece in _split_long_text(text, chunk_size):
+                    yield make(f"{lead}\n{piece}" if lead else piece, meta, block_type="text")
+                    lead = ""
+                continue
+
+            buf.append(text)
+            buf_len += len(text) + 1
+            buf_has_body = True
+
+        # Page boundary: flush so every chunk maps to exactly one page.
+        # A heading with no body yet is carried over to the next page.
+        if buf_has_body:
+            yield make("\n".join(buf), meta, block_type="text")
+            buf, buf_len, buf_has_body = [], 0, False
+
+    if buf:
+        yield make("\n".join(buf), meta, block_type="text")
+
+
 def get_text_chunks(docs):
-    # Large chunk size to keep tables and long sections intact
-    splitter = RecursiveCharacterTextSplitter(chunk_size=3000, chunk_overlap=500)
-    return splitter.split_documents(docs)
+    return list(iter_structured_chunks(docs))
+
+
+def _join_pieces(pieces):
+    """Reassembles ordered chunks, dropping repeated table headers."""
+    out = []
+    for d in pieces:
+        if d.metadata.get("table_part", 0) > 0 and out:
+            out[-1] += "\n" + d.page_content.split("\n", 1)[-1]
+        else:
+            out.append(d.page_content)
+    return "\n\n".join(out)
+
+
+def build_parent_index(vs):
+    """Groups stored chunks by section_id, ordered as they appear in the document."""
+    sections = {}
+    for doc in vs.docstore._dict.values():
+        sid = doc.metadata.get("section_id")
+        if sid:
+            sections.setdefault(sid, []).append(doc)
+    for pieces in sections.values():
+        pieces.sort(key=lambda d: d.metadata.get("chunk_index", 0))
+    return sections
+
+
+def expand_to_parents(docs, sections):
+    """
+    Swaps retrieved chunks for their parents only when needed: a table hit
+    brings back the whole table, and a section with several hits is sent
+    whole, both only if they fit MAX_PARENT_CHARS. An oversized table falls
+    back to the hit part plus its neighbouring parts. Other chunks pass
+    through as-is.
+    """
+    hits = {}
+    for d in docs:
+        sid = d.metadata.get("section_id")
+        hits[sid] = hits.get(sid, 0) + 1
+
+    out, seen = [], set()
+    for d in docs:
+        sid = d.metadata.get("section_id")
+        pieces = sections.get(sid)
+        if not pieces:
+            out.append(d.page_content)
+            continue
+        if sid in seen:
+            continue
+
+        if hits[sid] >= SECTION_HIT_THRESHOLD:
+            text = _join_pieces(pieces)
+            if len(text) <= MAX_PARENT_CHARS:
+                seen.add(sid)
+                out.append(f"[{d.metadata.get('section_title') or 'Section'}]\n{text}")
+                continue
+
+        table_id = d.metadata.get("table_id")
+        if not table_id:
+            if id(d) not in seen:
+                seen.add(id(d))
+                out.append(d.page_content)
+            continue
+        if table_id in seen:
+            continue
+
+        parts = [p for p in pieces if p.metadata.get("table_id") == table_id]
+        text = _join_pieces(parts)
+        if len(text) <= MAX_PARENT_CHARS:
+            seen.add(table_id)
+            out.append(text)
+            continue
+
+        part_no = d.metadata.get("table_part", 0)
+        window = [p for p in parts if abs(p.metadata.get("table_part", 0) - part_no) <= 1
+                  and (table_id, p.metadata.get("table_part", 0)) not in seen]
+        if window:
+            seen.update((table_id, p.metadata.get("table_part", 0)) for p in window)
+            out.append(_join_pieces(window))
+    return out
 
 # ======================================================
 # 3. VECTOR STORE
 # ======================================================
 def create_vector_store(chunks, user_id):
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={"device": "cpu"})
+    from langchain_community.vectorstores import FAISS
+
+    embeddings = get_embeddings()
     path = f"data/user_{user_id}/faiss_index"
     os.makedirs(path, exist_ok=True)
     vs = FAISS.from_documents(chunks, embeddings)
@@ -58,11 +427,15 @@ def create_vector_store(chunks, user_id):
 def load_vector_store(user_id):
     path = f"data/user_{user_id}/faiss_index"
     if not os.path.exists(os.path.join(path, "index.faiss")): return None
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={"device": "cpu"})
-    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    from langchain_community.vectorstores import FAISS
+
+    return FAISS.load_local(path, get_embeddings(), allow_dangerous_deserialization=True)
 
 
 def build_rag_pipeline(user_id: int):
+    from langchain_core.prompts import PromptTemplate
+    from langchain_ollama import OllamaLLM
+
     vs = load_vector_store(user_id)
     if vs is None: raise ValueError("Index not found.")
     
@@ -92,11 +465,12 @@ def build_rag_pipeline(user_id: int):
     
     
     retriever = vs.as_retriever(search_kwargs={"k": 12})
+    sections = build_parent_index(vs)
 
     def run(q: str):
         
         docs = retriever.invoke(q)
-        context_text = "\n\n".join([doc.page_content for doc in docs])
+        context_text = "\n\n".join(expand_to_parents(docs, sections))
         
         
         response = llm.invoke(prompt.format(context=context_text, question=q))
@@ -0,0 +1,145 @@
+"""
+Startup-time report: per-module import cost and baseline RSS.
+
+Runs the imports in a fresh interpreter with `python -X importtime` so the
+numbers match what a new Streamlit worker pays.
+
+Usage:
+    python startup_report.py           # what the login page pays
+    python startup_report.py --full    # plus the lazily loaded subsystems
+    python startup_report.py --prewarm # time each rag_pipeline pre-warm step
+"""
+import argparse
+import subprocess
+import sys
+
+# What app.py imports before the login page renders
+LOGIN_MODULES = ["streamlit", "database", "auth", "admin", "rag_pipeline"]
+
+# Subsystems that are only loaded on first use (or by pre-warm after login).
+# These are the concrete modules: the langchain_community packages and
+# langchain_huggingface defer pypdf, faiss and sentence_transformers/torch.
+# torch goes first so its cost is not folded into sentence_transformers.
+LAZY_MODULES = [
+    "torch",
+    "sentence_transformers",
+    "faiss",
+    "pypdf",
+    "langchain_community.document_loaders.pdf",
+    "langchain_community.vectorstores.faiss",
+    "langchain_huggingface",
+    "langchain_ollama",
+    "pdf2image",
+    "pytesseract",
+    "pandas",
+    "plotly.express",
+]
+
+CHILD = """
+import resource, sys, time
+prewarm = sys.argv[1] == "--prewarm"
+start = time.perf_counter()
+for name in sys.argv[2:]:
+    try:
+        # __import__ (unlike importlib.import_module) is logged by -X importtime
+        __import__(name)
+    except Exception as e:
+        print("MISSING", name, type(e).__name__, file=sys.stdout)
+if prewarm:
+    import rag_pipeline
+    rag_pipeline.prewarm(background=False)
+    for label, seconds in rag_pipeline.LOAD_TIMES.items():
+        print("STEP", label, seconds)
+    for label, error in rag_pipeline.PREWARM_ERRORS.items():
+        print("FAILED", label, error.replace("\\n", " "))
+print("WALL", time.perf_counter() - start)
+print("RSS", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def iter_importtime(stderr):
+    """Yields (module, depth, cumulative seconds) from `-X importtime` output."""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        yield name.strip(), len(name) - len(name.lstrip()) - 1, int(cumulative) / 1e6
+
+
+def parse_importtime(stderr, baseline=frozenset()):
+    """
+    Returns {top-level package: cumulative seconds} for modules imported at
+    depth 0, leaving out `baseline` (what the interpreter and the measuring
+    script load on their own).
+    """
+    costs = {}
+    for module, depth, seconds in iter_importtime(stderr):
+        if depth == 0 and module not in baseline:
+            package = module.split(".")[0]
+            costs[package] = costs.get(package, 0) + seconds
+    return costs
+
+
+def measure(modules, prewarm=False, baseline=frozenset()):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD,
+                           "--prewarm" if prewarm else "--", *modules],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        sys.exit(f"❌ Measurement process exited with code {proc.returncode}:\n" + "\n".join(errors))
+    wall, rss, missing, steps = 0.0, 0, [], {}
+    for line in proc.stdout.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "STEP":
+            label, seconds = value.split()
+            steps[label] = float(seconds)
+        elif key == "WALL":
+            wall = float(value)
+        elif key == "RSS":
+            rss = int(value)  # KB on Linux
+        elif key in ("MISSING", "FAILED"):
+            missing.append(f"{key.lower()}: {value}")
+    seen = {module for module, _, _ in iter_importtime(proc.stderr)}
+    return wall, rss, parse_importtime(proc.stderr, baseline), missing, steps, seen
+
+
+def measure_baseline():
+    """Modules and RSS of the measuring interpreter with nothing imported (-c pass equivalent)."""
+    _, rss, _, _, _, seen = measure([])
+    return frozenset(seen), rss
+
+
+def print_report(title, modules, top, baseline, base_rss, prewarm=False):
+    wall, rss, costs, missing, steps, _ = measure(modules, prewarm, baseline)
+    print(f"\n--- ⏱️ {title} ---")
+    print(f"Import wall time: {wall:.2f} s | Peak RSS: {rss / 1024:.0f} MB "
+          f"(+{(rss - base_rss) / 1024:.0f} MB over a bare interpreter)")
+    for label, seconds in steps.items():
+        print(f"  pre-warm {label:<12} {seconds:8.3f} s")
+    for package, seconds in sorted(costs.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {seconds:8.3f} s  {package}")
+    for entry in missing:
+        print(f"  ⚠️ {entry}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-module import cost at startup.")
+    parser.add_argument("--full", action="store_true", help="Also measure the lazily loaded subsystems")
+    parser.add_argument("--prewarm", action="store_true", help="Run rag_pipeline's pre-warm and time each step")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    baseline, base_rss = measure_baseline()
+    print_report("Login page (app.py top-level imports)", LOGIN_MODULES, args.top, baseline, base_rss)
+    if args.full:
+        print_report("Fully warmed (login + lazy subsystems)", LOGIN_MODULES + LAZY_MODULES,
+                     args.top, baseline, base_rss)
+    if args.prewarm:
+        print_report("Login + rag_pipeline pre-warm (as after login)", LOGIN_MODULES,
+                     args.top, baseline, base_rss, prewarm=True)
+
+
+if __name__ == "__main__":
+    main()